@@ -1,173 +1,315 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import csv
 import io
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+import lxml.html
+from lxml import etree
 import json
 import os
+import http.cookiejar
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson; jsonify responses skip the str round-trip."""
+
+    def dumps(self, obj, **kwargs):
+        # Map the json.dumps options orjson can express; reject the rest
+        option = 0
+        indent = kwargs.pop("indent", None)
+        if indent is not None:
+            if indent != 2:
+                raise TypeError("orjson only supports indent=2")
+            option |= orjson.OPT_INDENT_2
+        if kwargs.pop("sort_keys", False):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.pop("ensure_ascii", False):
+            raise TypeError("orjson always emits UTF-8; ensure_ascii=True is not supported")
+        # orjson output is always compact, which Flask's session serializer asks for
+        if kwargs.pop("separators", (",", ":")) != (",", ":"):
+            raise TypeError("orjson only supports compact separators")
+        default = kwargs.pop("default", self.default)
+        if kwargs:
+            raise TypeError(f"Unsupported dumps() options for orjson: {', '.join(sorted(kwargs))}")
+        return orjson.dumps(obj, default=default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            raise TypeError(f"Unsupported loads() options for orjson: {', '.join(sorted(kwargs))}")
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # _prepare_response_obj and _app are Flask internals; matches the pinned Flask 2.3
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Per-domain cache of successful SEO results; upstream data changes at most daily.
+# In-process only, so each worker keeps its own copy.
+SEO_CACHE_TTL = 3600
+_CACHE = TTLCache(maxsize=1024, ttl=SEO_CACHE_TTL)
+_CACHE_LOCK = threading.Lock()
+
+# Short-lived cache of failed scrapes so repeated calls for a failing domain
+# (e.g. monitoring retries) don't hammer the upstream
+NEG_CACHE_TTL = 60
+_NEG_CACHE = TTLCache(maxsize=512, ttl=NEG_CACHE_TTL)
+
+# Upstream ETag/Last-Modified validators plus the result they produced, kept longer
+# than _CACHE so expired entries can be revalidated with a conditional GET
+_VALIDATOR_TTL = 86400
+_VALIDATORS = TTLCache(maxsize=1024, ttl=_VALIDATOR_TTL)
+
+# Inline scripts, styles and comments carry nothing get_seo_data reads; cut them
+# from the raw bytes in one pass so lxml never tokenizes them
+_IRRELEVANT_MARKUP_RE = re.compile(
+    rb"<script(?=[\s>/])[^>]*>.*?</script\s*>|<style(?=[\s>/])[^>]*>.*?</style\s*>|<!--.*?-->",
+    re.I | re.S
+)
+
+# charset parameter of a Content-Type header
+_CHARSET_RE = re.compile(r";\s*charset=[\"']?([^\"';\s]+)", re.I)
+
+# XPath queries used by get_seo_data, compiled once per process
+_P_XP = etree.XPath("//p")
+_SECTION_NODES_XP = etree.XPath("//h3 | //table")
+_METRIC_VALUE_XP = etree.XPath("(following-sibling::p[1]//a)[1]")
+_KEYWORD_TABLE_XP = etree.XPath('(//div[contains(concat(" ", normalize-space(@class), " "), " table ")])[1]')
+_ROWS_XP = etree.XPath(".//tr")
+_HREFS_XP = etree.XPath(".//a/@href", smart_strings=False)
+
+# Response metric keys and the page labels they are read from
+METRIC_LABELS = {
+    "organic_traffic": "Organic Search Traffic",
+    "traffic_value": "Traffic Value",
+    "authority_score": "Authority Score",
+    "visits": "Visits",
+    "pages_per_visit": "Pages / Visit",
+    "avg_visit_duration": "Avg. Visit Duration",
+    "bounce_rate": "Bounce Rate",
+    "total_referring_domains": "Total Referring Domains",
+    "ranking_keywords": "Ranking Keywords"
+}
+
+# Upstream traffic checker; formatted with the normalized domain
+URL_TMPL = "https://tools.trafficthinktank.com/website-traffic-checker?q={}"
+
+# Headers to mimic a real browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+    # Brotli needs the brotli package; requests/urllib3 decode all three transparently
+    "Accept-Encoding": "br, gzip, deflate",
+    "Referer": "https://www.google.com/"
+}
+
+# Shared session so upstream requests reuse pooled keep-alive connections
+UPSTREAM_POOL_SIZE = 64
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+# Keep scrapes stateless like plain requests.get: never store upstream cookies,
+# so one caller's session/quota cookies can't leak into everyone else's lookups
+_SESSION.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=UPSTREAM_POOL_SIZE,
+    max_retries=Retry(total=2, backoff_factor=0.3)
+))
+
+# Process-wide cap on in-flight upstream requests across all callers and batches;
+# no larger than the connection pool, so every request can reuse a pooled connection
+_UPSTREAM_SLOTS = threading.BoundedSemaphore(UPSTREAM_POOL_SIZE)
+
+# Batch lookups scrape every domain at once; scraping is network-bound
+MAX_BATCH_SIZE = 20
+
+# Optional scheme and 'www.' prefix, then a host and optional numeric port that must
+# run up to the path/query/fragment, so bare or unsupported schemes ("http://",
+# "ftp://x.com") don't match as a host
+_DOMAIN_RE = re.compile(r"^(?:https?://)?(?:www\.)?([^/?#:]+(?::\d+)?)(?=[/?#]|$)", re.I)
 
 def normalize_domain(url):
-    """Extracts and returns only the domain from any given URL format."""
-    if not url.startswith(("http://", "https://")):
-        url = "https://" + url  # Ensure proper URL format if not provided
-    parsed_url = urlparse(url)
-    domain = parsed_url.netloc
-    if domain.startswith("www."):
-        domain = domain[4:]  # Remove 'www.' if present
-    return domain
+    """Extracts and returns only the lowercased domain from any given URL format."""
+    match = _DOMAIN_RE.match(url.strip())
+    return match.group(1).lower() if match else ""
+
+def _text(node):
+    """Return the stripped text content of an element."""
+    # Leaf cells (the common case) need no XPath string() evaluation
+    if len(node) == 0:
+        return (node.text or "").strip()
+    return node.text_content().strip()
+
+def _parse_html(content, content_type):
+    """Parse HTML bytes, honouring an explicit charset from the Content-Type header."""
+    # Without one, let lxml sniff <meta charset>; requests' own fallback
+    # (ISO-8859-1 for text/*) would be wrong as often as libxml2's
+    match = _CHARSET_RE.search(content_type or "")
+    if match:
+        try:
+            return lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding=match.group(1)))
+        except LookupError:
+            pass  # Unknown charset name; fall back to sniffing
+    return lxml.html.fromstring(content)
+
+def _metric_value(label_node):
+    """Return the linked value following a metric label <p>, or "Not Found"."""
+    value_links = _METRIC_VALUE_XP(label_node) if label_node is not None else None
+    return _text(value_links[0]) if value_links else "Not Found"
+
+def _table_rows(table):
+    """Yield the <td> cells of each row in a table, skipping the header row."""
+    for row in _ROWS_XP(table)[1:]:
+        yield list(row.iter("td"))
+
+def _parse_backlink_row(cols):
+    """Build a backlink entry from a Backlinks table row."""
+    hrefs = _HREFS_XP(cols[0])
+    return {
+        "source_url": hrefs[0].strip() if hrefs else "N/A",
+        "target_url": hrefs[-1].strip() if hrefs else "N/A",
+        "anchor_text": _text(cols[1]),
+        "follow_type": _text(cols[2])
+    }
+
+def _parse_top_page_row(cols):
+    """Build a top page entry (URL, traffic %, keywords) from a Top Pages table row."""
+    page_link = next(cols[0].iter("a"), None)
+    return {
+        "page_url": _text(page_link) if page_link is not None else _text(cols[0]),
+        "traffic_percentage": _text(cols[1]),
+        "keywords": _text(cols[2])
+    }
+
+def _parse_competitor_row(cols):
+    """Build a competitor entry from a Main Organic Competitors table row."""
+    return {
+        "domain": _text(cols[0]),
+        "common_keywords": _text(cols[1]),
+        "competition_level": _text(cols[2])
+    }
+
+def _parse_keyword_row(cols):
+    """Build a ranking keyword entry from a row of the keywords table."""
+    return {
+        "keyword": _text(cols[0]),
+        "rank": _text(cols[1]),
+        "traffic_percentage": _text(cols[2]),
+        "volume": _text(cols[3]),
+        "kd_percentage": _text(cols[4]),
+        "cpc": _text(cols[5]),
+        "num_results": _text(cols[6]),
+        "search_trend": _text(cols[7])
+    }
 
 def get_seo_data(domain):
     """Fetch and parse SEO data for a given domain."""
     # Generate Target URL
-    url = f"https://tools.trafficthinktank.com/website-traffic-checker?q={domain}"
-
-    # Headers to mimic a real browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://www.google.com/"
-    }
+    url = URL_TMPL.format(domain)
 
     try:
+        # Revalidate against the upstream if we have validators from a previous scrape
+        conditional_headers = {}
+        with _CACHE_LOCK:
+            validators = _VALIDATORS.get(domain)
+        if validators is not None:
+            if validators["etag"]:
+                conditional_headers["If-None-Match"] = validators["etag"]
+            if validators["last_modified"]:
+                conditional_headers["If-Modified-Since"] = validators["last_modified"]
+
         # Send a GET request
-        response = requests.get(url, headers=headers, timeout=30)
+        with _UPSTREAM_SLOTS:
+            response = _SESSION.get(url, headers=conditional_headers, timeout=30)
+
+        # Page unchanged since the last scrape; reuse its parsed result
+        if response.status_code == 304 and validators is not None:
+            return validators["data"], None
 
         # Check if the request was successful
         if response.status_code != 200:
             return {"error": f"Failed to retrieve the page. Status Code: {response.status_code}"}, None
 
         # Parse the HTML content
-        soup = BeautifulSoup(response.text, "html.parser")
+        body = _IRRELEVANT_MARKUP_RE.sub(b"", response.content)
+        try:
+            root = _parse_html(body, response.headers.get("Content-Type"))
+        except etree.ParserError:
+            # lxml rejects documents with no elements (empty, doctype-only, ...);
+            # an empty <html> makes every field "Not Found"
+            root = lxml.html.Element("html")
+
+        # Index metric labels in a single pass over <p> tags (first occurrence wins)
+        metric_map = {}
+        for p in _P_XP(root):
+            metric_map.setdefault(_text(p), p)
 
-        def extract_metric(metric_name):
-            """Helper function to extract a metric from the page."""
-            metric_section = soup.find("p", string=metric_name)
-            if metric_section:
-                value_tag = metric_section.find_next_sibling("p")
-                if value_tag and value_tag.find("a"):
-                    return value_tag.find("a").text.strip()
-            return "Not Found"
+        # Map each <h3> heading to the first <table> after it, in a single pass
+        # (XPath unions are returned in document order)
+        sections = {}
+        pending_headings = []
+        for node in _SECTION_NODES_XP(root):
+            if node.tag == "h3":
+                heading = _text(node)
+                if heading not in sections:
+                    sections[heading] = None
+                    pending_headings.append(heading)
+            else:
+                for heading in pending_headings:
+                    sections[heading] = node
+                pending_headings.clear()
 
         # Extract required metrics
-        organic_traffic = extract_metric("Organic Search Traffic")
-        traffic_value = extract_metric("Traffic Value")
-        authority_score = extract_metric("Authority Score")
-        visits = extract_metric("Visits")
-        pages_per_visit = extract_metric("Pages / Visit")
-        avg_visit_duration = extract_metric("Avg. Visit Duration")
-        bounce_rate = extract_metric("Bounce Rate")
-        total_referring_domains = extract_metric("Total Referring Domains")
-        ranking_keywords = extract_metric("Ranking Keywords")
+        metrics = {key: _metric_value(metric_map.get(label)) for key, label in METRIC_LABELS.items()}
 
         # Extract Backlinks
-        backlinks = []
-        backlinks_section = soup.find("h3", string="Backlinks")
-        if backlinks_section:
-            backlinks_table = backlinks_section.find_next("table")
-            if backlinks_table:
-                rows = backlinks_table.find_all("tr")[1:]  # Skip header row
-                for row in rows:
-                    cols = row.find_all("td")
-                    if len(cols) >= 4:
-                        source_url = cols[0].find("a")["href"].strip() if cols[0].find("a") else "N/A"
-                        target_url = cols[0].find_all("a")[-1]["href"].strip() if cols[0].find_all("a") else "N/A"
-                        anchor_text = cols[1].text.strip()
-                        follow_type = cols[2].text.strip()
-                        backlinks.append({
-                            "source_url": source_url,
-                            "target_url": target_url,
-                            "anchor_text": anchor_text,
-                            "follow_type": follow_type
-                        })
+        backlinks_table = sections.get("Backlinks")
+        backlinks = [
+            _parse_backlink_row(cols) for cols in _table_rows(backlinks_table) if len(cols) >= 4
+        ] if backlinks_table is not None else []
 
         # Extract Top Pages (URLs, Traffic %, Keywords)
-        top_pages = []
-        top_pages_section = soup.find("h3", string="Top Pages")
-        if top_pages_section:
-            top_pages_table = top_pages_section.find_next("table")
-            if top_pages_table:
-                rows = top_pages_table.find_all("tr")[1:]  # Skip header row
-                for row in rows:
-                    cols = row.find_all("td")
-                    if len(cols) >= 3:
-                        page_url = cols[0].find("a").text.strip() if cols[0].find("a") else cols[0].text.strip()
-                        traffic_percentage = cols[1].text.strip()
-                        keywords = cols[2].text.strip()
-                        top_pages.append({
-                            "page_url": page_url,
-                            "traffic_percentage": traffic_percentage,
-                            "keywords": keywords
-                        })
+        top_pages_table = sections.get("Top Pages")
+        top_pages = [
+            _parse_top_page_row(cols) for cols in _table_rows(top_pages_table) if len(cols) >= 3
+        ] if top_pages_table is not None else []
 
         # Extract Main Organic Competitors
-        competitors = []
-        competitors_section = soup.find("h3", string="Main Organic Competitors")
-        if competitors_section:
-            competitors_table = competitors_section.find_next("table")
-            if competitors_table:
-                rows = competitors_table.find_all("tr")[1:]  # Skip header row
-                for row in rows:
-                    cols = row.find_all("td")
-                    if len(cols) >= 3:
-                        domain = cols[0].text.strip()
-                        com_keywords = cols[1].text.strip()
-                        com_level = cols[2].text.strip()
-                        competitors.append({
-                            "domain": domain,
-                            "common_keywords": com_keywords,
-                            "competition_level": com_level
-                        })
+        competitors_table = sections.get("Main Organic Competitors")
+        competitors = [
+            _parse_competitor_row(cols) for cols in _table_rows(competitors_table) if len(cols) >= 3
+        ] if competitors_table is not None else []
 
         # Extract Top Ranking Keywords with additional details
-        top_keywords = []
-        keyword_table = soup.find("div", class_="table")
-        if keyword_table:
-            rows = keyword_table.find_all("tr")[1:]  # Skip header row
-            for row in rows:
-                cols = row.find_all("td")
-                if len(cols) >= 8:  # Ensure there are enough columns
-                    keyword = cols[0].text.strip()
-                    rank = cols[1].text.strip()
-                    traffic_percentage = cols[2].text.strip()
-                    volume = cols[3].text.strip()
-                    kd_percentage = cols[4].text.strip()
-                    cpc = cols[5].text.strip()
-                    num_results = cols[6].text.strip()
-                    search_trend = cols[7].text.strip()
-                    top_keywords.append({
-                        "keyword": keyword,
-                        "rank": rank,
-                        "traffic_percentage": traffic_percentage,
-                        "volume": volume,
-                        "kd_percentage": kd_percentage,
-                        "cpc": cpc,
-                        "num_results": num_results,
-                        "search_trend": search_trend
-                    })
+        keyword_tables = _KEYWORD_TABLE_XP(root)
+        top_keywords = [
+            _parse_keyword_row(cols) for cols in _table_rows(keyword_tables[0]) if len(cols) >= 8
+        ] if keyword_tables else []
 
         # Create JSON result
         result = {
             "domain": domain,
-            "metrics": {
-                "organic_traffic": organic_traffic,
-                "traffic_value": traffic_value,
-                "authority_score": authority_score,
-                "visits": visits,
-                "pages_per_visit": pages_per_visit,
-                "avg_visit_duration": avg_visit_duration,
-                "bounce_rate": bounce_rate,
-                "total_referring_domains": total_referring_domains,
-                "ranking_keywords": ranking_keywords
-            },
+            "metrics": metrics,
             "top_keywords": top_keywords,
             "backlinks": backlinks,
             "competitors": competitors,
             "top_pages": top_pages
         }
 
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            with _CACHE_LOCK:
+                _VALIDATORS[domain] = {"etag": etag, "last_modified": last_modified, "data": result}
+
         return result, None
 
     except requests.exceptions.RequestException as e:
@@ -175,17 +317,38 @@ def get_seo_data(domain):
     except Exception as e:
         return {"error": f"An error occurred: {str(e)}"}, None
 
+def get_cached_seo_data(domain):
+    """Return SEO data for a domain, serving from and populating the caches."""
+    # Serve from cache if this domain was scraped (or failed) recently
+    with _CACHE_LOCK:
+        cached = _CACHE.get(domain) or _NEG_CACHE.get(domain)
+    if cached is not None:
+        return cached
+
+    # Get SEO data
+    data, _ = get_seo_data(domain)
+
+    with _CACHE_LOCK:
+        if "error" in data:
+            _NEG_CACHE[domain] = data
+        else:
+            _CACHE[domain] = data
+
+    return data
+
 @app.route('/')
 def home():
     return jsonify({
         "message": "SEO Data API is running!",
         "endpoints": {
             "GET /api/seo-data": "Fetch SEO data for a domain",
+            "GET /api/seo-data/batch": f"Fetch SEO data for up to {MAX_BATCH_SIZE} domains concurrently",
             "parameters": {
-                "url": "Domain URL (required)"
+                "url": "Domain URL (required, repeatable for batch)"
             }
         },
-        "example": "/api/seo-data?url=example.com"
+        "example": "/api/seo-data?url=example.com",
+        "batch_example": "/api/seo-data/batch?url=example.com&url=example.org"
     })
 
 @app.route('/api/seo-data', methods=['GET'])
@@ -196,15 +359,38 @@ def fetch_seo_data():
 
     # Normalize domain
     domain = normalize_domain(url)
+    if not domain:
+        return jsonify({"error": "Invalid URL. Could not extract a domain from the 'url' parameter."}), 400
 
     # Get SEO data
-    data, _ = get_seo_data(domain)
+    data = get_cached_seo_data(domain)
 
     if "error" in data:
         return jsonify(data), 500
 
     return jsonify(data)
 
+@app.route('/api/seo-data/batch', methods=['GET'])
+def fetch_seo_data_batch():
+    urls = [url for url in request.args.getlist('url') if url]
+    if not urls:
+        return jsonify({"error": "No URL provided. Please include one or more 'url' parameters."}), 400
+
+    # Normalize and de-duplicate domains, keeping request order
+    domains = [domain for domain in dict.fromkeys(normalize_domain(url) for url in urls) if domain]
+    if not domains:
+        return jsonify({"error": "Invalid URL. Could not extract a domain from any 'url' parameter."}), 400
+    if len(domains) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Too many domains. A batch may contain at most {MAX_BATCH_SIZE}."}), 400
+
+    # Scrape all domains concurrently on a pool sized to this batch, so it costs about
+    # one upstream round-trip and doesn't queue behind other batches; per-domain
+    # failures are reported inline
+    with ThreadPoolExecutor(max_workers=len(domains)) as executor:
+        results = list(executor.map(get_cached_seo_data, domains))
+
+    return jsonify({"results": dict(zip(domains, results))})
+
 @app.route('/health')
 def health_check():
     return jsonify({"status": "healthy", "message": "API is running"})